@@ -1,14 +1,28 @@
 import sqlite3
 import tkinter as tk
-from tkinter import messagebox, ttk
-from PIL import Image, ImageTk
+from tkinter import filedialog, messagebox, ttk
 import requests
 import io
 import os
+import csv
+import gzip
+import time
+import hashlib
+import argparse
+import asyncio
+import ssl
+import json
+import base64
+import queue
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urljoin, urlparse, urlsplit
+from requests.utils import get_environ_proxies, requote_uri, select_proxy
 
 # TODO:
 # In statistics add the display mode for all LEGOS of the same series
-# Optimize loading of the display mode
 
 # Ensure the database is created in the same folder as the script
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,38 +32,234 @@ DATABASE_NAME = os.path.join(BASE_DIR, 'lego_database.db')
 BG_COLOR = '#e0ffe0' # Light green background
 FRAME_COLOR = '#c0f0c0' # Slightly darker green for frames
 TEXT_COLOR = '#000000' # Black text
+FAVORITE_BG_COLOR = '#fff5cc' # Light gold/yellow for favorites
+CARD_OUTLINE_COLOR = '#80b080' # Border of gallery cards
+
+# Gallery renderer: 'canvas' draws cards as Canvas items, 'widgets' builds a LabelFrame per card
+GALLERY_RENDERER = 'canvas'
+
+# Image loading
+IMAGE_TIMEOUT = 15 # Seconds before a picture download is abandoned
+IMAGE_WORKERS = 8 # Background threads downloading gallery pictures
+DECODED_IMAGE_CACHE_BYTES = 32 * 1024 * 1024 # Pixel memory of decoded originals kept so other sizes skip the download
+IMAGE_CACHE_DIR = os.path.join(BASE_DIR, 'image_cache') # Thumbnails on disk, one PNG per URL and size
+THUMBNAIL_SIZES = ((150, 150), (200, 150), (350, 250)) # Every size the app displays
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Background cache warming
+WARM_CACHE_RATE = 10 # Requests per second overall
+WARM_CACHE_PER_HOST_RATE = 2 # Requests per second to a single host
+WARM_CACHE_BATCH = 50 # URLs processed between checkpoints
+
+# Picture link checker
+LINK_CHECK_CONCURRENCY = 50 # Requests in flight overall
+LINK_CHECK_PER_HOST = 6 # Requests in flight to a single host
+LINK_CHECK_TIMEOUT = 10 # Seconds per request
+# A checked picture URL is ok, dead (the server said it's gone or not an image) or failed (timeout, no
+# connection or a server error, worth retrying); the three conditions never overlap
+IMAGE_OK_SQL = "status < 400 AND COALESCE(content_type, '') NOT LIKE 'text/%'"
+IMAGE_DEAD_SQL = "(status >= 400 AND status < 500) OR (status < 400 AND content_type LIKE 'text/%')"
+IMAGE_FAILED_SQL = "status IS NULL OR status >= 500"
+
+EXPORT_BATCH = 1000 # Rows fetched and written per step of an export
+IMPORT_PROGRESS_ROWS = 10000 # CSV rows read between progress reports of an import
+BENCHMARK_SAMPLES = 50 # Cards timed per path by --benchmark-display
+
+# Local HTTP JSON API
+API_HOST = '127.0.0.1'
+API_PORT = 8765
+API_PAGE_SIZE = 100 # Items per page unless the client asks for a limit
+API_MAX_PAGE_SIZE = 1000
+
+# Search filter choices for parts inventory -> value of search_legos_in_db(buildable=...)
+BUILDABLE_FILTERS = {'': None, 'Можна зібрати': True, 'Бракує деталей': False}
+# Search filter choices for picture health -> value of search_legos_in_db(image_health=...)
+IMAGE_HEALTH_FILTERS = {'': None, 'Робочі': 'ok', 'Недоступні': 'dead', 'Не відповідають': 'failed', 'Не перевірені': 'unchecked'}
+
+def _legos_columns(cursor):
+    """Returns the column names of the legos table."""
+    cursor.execute("PRAGMA table_info(legos)")
+    return [col[1] for col in cursor.fetchall()]
+
+def _migration_create_legos(cursor):
+    # IF NOT EXISTS keeps databases created before migrations were tracked working
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS legos (
+            articul TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            part_count INTEGER,
+            all_parts INTEGER, -- 0 for False, 1 for True
+            picture TEXT,
+            series TEXT,
+            favorite INTEGER DEFAULT 0 -- 0 for False, 1 for True
+        )
+    ''')
+
+def _migration_add_series(cursor):
+    # Very old databases were created without the 'series' column
+    if 'series' not in _legos_columns(cursor):
+        cursor.execute("ALTER TABLE legos ADD COLUMN series TEXT")
+
+def _migration_add_favorite(cursor):
+    if 'favorite' not in _legos_columns(cursor):
+        cursor.execute("ALTER TABLE legos ADD COLUMN favorite INTEGER DEFAULT 0")
+
+def _migration_add_search_indexes(cursor):
+    # Series lookups (combobox, statistics) and the favorites gallery filter on these columns
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_legos_series ON legos(series)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_legos_favorite ON legos(favorite)")
+
+def _migration_create_cache_warm_state(cursor):
+    # Checkpoint of the background thumbnail job, so it resumes after the app is closed
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_warm_state (
+            job TEXT PRIMARY KEY,
+            last_url TEXT NOT NULL, -- URLs are processed in order, everything up to this one is done
+            processed INTEGER NOT NULL,
+            failed INTEGER NOT NULL,
+            updated_at REAL
+        )
+    ''')
+
+def _migration_create_image_health(cursor):
+    # Results of the picture link checker, one row per URL
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_health (
+            url TEXT PRIMARY KEY,
+            status INTEGER, -- HTTP status, NULL when the request failed outright
+            latency_ms REAL,
+            content_type TEXT,
+            content_length INTEGER,
+            error TEXT,
+            checked_at REAL
+        )
+    ''')
+
+def _migration_create_collection_version(cursor):
+    # Change counter behind the HTTP API's ETags; triggers catch every writer of the legos table
+    cursor.execute("CREATE TABLE IF NOT EXISTS collection_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)")
+    cursor.execute("INSERT OR IGNORE INTO collection_version (id, version) VALUES (1, 0)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS legos_version_after_{event.lower()} AFTER {event} ON legos
+            BEGIN
+                UPDATE collection_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+def _bump_collection_version(cursor):
+    """Marks the collection as changed after bulk writes to tables without version triggers."""
+    cursor.execute("UPDATE collection_version SET version = version + 1 WHERE id = 1")
+
+def _migration_create_inventory(cursor):
+    # Parts needed by each set (spare parts are not stored)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS set_parts (
+            articul TEXT NOT NULL,
+            part_num TEXT NOT NULL,
+            color_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (articul, part_num, color_id)
+        ) WITHOUT ROWID
+    ''')
+    # Covering index so buildability joins from owned parts never touch the table
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_set_parts_part_color ON set_parts(part_num, color_id, articul, quantity)")
+    # Loose parts the user owns
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS owned_parts (
+            part_num TEXT NOT NULL,
+            color_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (part_num, color_id)
+        ) WITHOUT ROWID
+    ''')
+    # Per-set totals, refreshed after every set_parts import
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS set_part_totals (
+            articul TEXT PRIMARY KEY,
+            total_quantity INTEGER NOT NULL,
+            line_count INTEGER NOT NULL
+        )
+    ''')
+    # Missing quantity per set: totals minus what owned parts cover, joined through the covering index
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS set_missing_parts AS
+        SELECT t.articul, t.total_quantity, t.total_quantity - COALESCE(c.covered, 0) AS missing_quantity
+        FROM set_part_totals t
+        LEFT JOIN (
+            SELECT sp.articul, SUM(MIN(sp.quantity, op.quantity)) AS covered
+            FROM owned_parts op
+            JOIN set_parts sp ON sp.part_num = op.part_num AND sp.color_id = op.color_id
+            GROUP BY sp.articul
+        ) c ON c.articul = t.articul
+    ''')
+
+def _refresh_missing_quantities(cursor, sets_sql="SELECT articul FROM set_part_totals"):
+    """Recomputes the stored missing quantity of the sets selected by sets_sql from set_parts and owned_parts."""
+    # Primary key range scan per set, with owned parts looked up by their primary key
+    cursor.execute(f"""UPDATE set_part_totals SET missing_quantity = (
+                           SELECT COALESCE(SUM(MAX(sp.quantity - COALESCE(op.quantity, 0), 0)), 0)
+                           FROM set_parts sp
+                           LEFT JOIN owned_parts op ON op.part_num = sp.part_num AND op.color_id = sp.color_id
+                           WHERE sp.articul = set_part_totals.articul)
+                       WHERE articul IN ({sets_sql})""")
+
+def _migration_add_missing_quantity(cursor):
+    # Buildability searches filter on a stored per-set column instead of joining the whole inventory
+    cursor.execute("PRAGMA table_info(set_part_totals)")
+    if 'missing_quantity' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE set_part_totals ADD COLUMN missing_quantity INTEGER NOT NULL DEFAULT 0")
+    _refresh_missing_quantities(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_set_part_totals_missing ON set_part_totals(missing_quantity, articul)")
+    cursor.execute("DROP VIEW IF EXISTS set_missing_parts")
+
+# Ordered schema migrations. The position in this list is the schema version stored
+# in PRAGMA user_version, so new migrations must only ever be appended.
+MIGRATIONS = [
+    ("create legos table", _migration_create_legos),
+    ("add series column", _migration_add_series),
+    ("add favorite column", _migration_add_favorite),
+    ("add series and favorite indexes", _migration_add_search_indexes),
+    ("create parts inventory tables", _migration_create_inventory),
+    ("create cache warming checkpoint table", _migration_create_cache_warm_state),
+    ("create image health table", _migration_create_image_health),
+    ("create collection version counter", _migration_create_collection_version),
+    ("add missing quantity to set part totals", _migration_add_missing_quantity),
+]
+SCHEMA_VERSION = len(MIGRATIONS)
 
 def initialize_database():
-    """Initializes the SQLite database and creates the legos table, adding series column if needed."""
+    """Brings the database schema up to date by running any pending migrations."""
+    conn = None # Initialize conn to None
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
+        # Autocommit mode, transactions are managed explicitly below
+        conn = sqlite3.connect(DATABASE_NAME, isolation_level=None)
         cursor = conn.cursor()
 
-        # Create table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS legos (
-                articul TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                part_count INTEGER,
-                all_parts INTEGER, -- 0 for False, 1 for True
-                picture TEXT,
-                series TEXT,
-                favorite INTEGER DEFAULT 0 -- 0 for False, 1 for True
-            )
-        ''')
-
-        # Check if 'series' column exists, add if not
-        cursor.execute("PRAGMA table_info(legos)")
-        columns = [col[1] for col in cursor.fetchall()]
-        if 'series' not in columns:
-            cursor.execute("ALTER TABLE legos ADD COLUMN series TEXT")
-            print("Added 'series' column to the database.")
-        if 'favorite' not in columns:
-            cursor.execute("ALTER TABLE legos ADD COLUMN favorite INTEGER DEFAULT 0")
-            print("Added 'favorite' column to the database.")
+        # Fast path: a current schema costs a single pragma read
+        current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if current_version >= SCHEMA_VERSION:
+            return
 
-        conn.commit()
-        print("Database initialized successfully.")
+        started = time.perf_counter()
+        for version, (description, migrate) in enumerate(MIGRATIONS, start=1):
+            if version <= current_version:
+                continue
+            step_started = time.perf_counter()
+            cursor.execute("BEGIN")
+            try:
+                migrate(cursor)
+                # user_version is part of the transaction, so a failed step leaves no trace
+                cursor.execute(f"PRAGMA user_version = {version}")
+                cursor.execute("COMMIT")
+            except sqlite3.Error:
+                cursor.execute("ROLLBACK")
+                raise
+            print(f"Migration {version} ({description}) applied in {(time.perf_counter() - step_started) * 1000:.1f} ms")
+
+        # Refresh planner statistics for the new schema
+        cursor.execute("ANALYZE")
+        print(f"Database migrated from version {current_version} to {SCHEMA_VERSION} in {(time.perf_counter() - started) * 1000:.1f} ms")
 
     except sqlite3.Error as e:
         print(f"Database error: {e}")
@@ -96,38 +306,54 @@ def update_lego_in_db(original_articul, new_articul, name, part_count, all_parts
         if conn:
             conn.close()
 
-def search_legos_in_db(articul=None, name=None, min_part_count=None, max_part_count=None, all_parts=None, series=None, favorite_only=None):
+LEGO_COLUMNS = ("articul", "name", "part_count", "all_parts", "picture", "series", "favorite")
+
+def build_search_filter(articul=None, name=None, min_part_count=None, max_part_count=None, all_parts=None, series=None, favorite_only=None, buildable=None, image_health=None):
+    """Builds the WHERE clause and parameters for the search criteria shared by the search view, the HTTP API and export."""
+    query = "1=1"
+    params = []
+
+    if articul:
+        query += " AND articul LIKE ?"
+        params.append(f'%{articul}%')
+    if name:
+        query += " AND name LIKE ?"
+        params.append(f'%{name}%')
+    if min_part_count is not None:
+        query += " AND part_count >= ?"
+        params.append(min_part_count)
+    if max_part_count is not None:
+        query += " AND part_count <= ?"
+        params.append(max_part_count)
+    if all_parts is not None:
+        query += " AND all_parts = ?"
+        params.append(all_parts)
+    if series:
+        query += " AND series LIKE ?"
+        params.append(f'%{series}%')
+    if favorite_only is not None: # Can be True (1) or False (0)
+        query += " AND favorite = ?"
+        params.append(1 if favorite_only else 0)
+    if buildable is not None: # True: buildable from owned parts, False: missing parts
+        query += " AND articul IN (SELECT articul FROM set_part_totals WHERE missing_quantity " + ("= 0)" if buildable else "> 0)")
+    if image_health == 'ok':
+        query += f" AND picture IN (SELECT url FROM image_health WHERE {IMAGE_OK_SQL})"
+    elif image_health == 'dead':
+        query += f" AND picture IN (SELECT url FROM image_health WHERE {IMAGE_DEAD_SQL})"
+    elif image_health == 'failed':
+        query += f" AND picture IN (SELECT url FROM image_health WHERE {IMAGE_FAILED_SQL})"
+    elif image_health == 'unchecked':
+        query += " AND picture IS NOT NULL AND picture != '' AND picture NOT IN (SELECT url FROM image_health)"
+    return query, params
+
+def search_legos_in_db(articul=None, name=None, min_part_count=None, max_part_count=None, all_parts=None, series=None, favorite_only=None, buildable=None, image_health=None):
     """Searches for LEGO entries in the database based on criteria."""
     conn = None # Initialize conn to None
     try:
         conn = sqlite3.connect(DATABASE_NAME)
         cursor = conn.cursor()
-        query = "SELECT articul, name, part_count, all_parts, picture, series, favorite FROM legos WHERE 1=1"
-        params = []
-
-        if articul:
-            query += " AND articul LIKE ?"
-            params.append(f'%{articul}%')
-        if name:
-            query += " AND name LIKE ?"
-            params.append(f'%{name}%')
-        if min_part_count is not None:
-            query += " AND part_count >= ?"
-            params.append(min_part_count)
-        if max_part_count is not None:
-            query += " AND part_count <= ?"
-            params.append(max_part_count)
-        if all_parts is not None:
-            query += " AND all_parts = ?"
-            params.append(all_parts)
-        if series:
-            query += " AND series LIKE ?"
-            params.append(f'%{series}%')
-        if favorite_only is not None: # Can be True (1) or False (0)
-            query += " AND favorite = ?"
-            params.append(1 if favorite_only else 0)
-
-        cursor.execute(query, params)
+        where, params = build_search_filter(articul, name, min_part_count, max_part_count, all_parts, series, favorite_only, buildable, image_health)
+        cursor.execute(f"SELECT {', '.join(LEGO_COLUMNS)} FROM legos WHERE {where}", params)
         results = cursor.fetchall()
         return results
 
@@ -169,19 +395,251 @@ def get_all_series():
         if conn:
             conn.close()
 
-def get_image_from_url(image_url, size=(150, 150)):
-    """Downloads an image from a URL and resizes it."""
+def _open_csv(path):
+    """Opens a CSV file for reading, transparently handling Rebrickable's .csv.gz downloads."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8-sig', newline='')
+
+def _csv_header(path):
+    """Returns the lower-case column names of a CSV file."""
+    with _open_csv(path) as f:
+        return [name.strip().lower() for name in next(csv.reader(f), [])]
+
+def _read_position(f):
+    """Returns how many bytes of the file behind a stream from _open_csv have been read."""
+    if isinstance(f.buffer, gzip.GzipFile):
+        return f.buffer.fileobj.tell() # Compressed bytes, to compare with the size of the file
+    return f.buffer.tell()
+
+def _iter_csv(path, columns, optional=(), on_progress=None):
+    """Yields tuples with the requested columns of every CSV row.
+
+    Each entry of columns is a tuple of accepted (lower-case) header names; positions listed in
+    optional may be absent from the file and then read as ''. on_progress, if given, is called
+    with the rows and bytes read so far every IMPORT_PROGRESS_ROWS rows.
+    """
+    with _open_csv(path) as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        indexes = []
+        for position, names in enumerate(columns):
+            found = [header.index(name) for name in names if name in header]
+            if not found and position not in optional:
+                raise KeyError(f"немає стовпця {names[0]}")
+            indexes.append(found[0] if found else None)
+        for count, row in enumerate(reader, start=1):
+            if on_progress and count % IMPORT_PROGRESS_ROWS == 0:
+                on_progress(count, _read_position(f))
+            if row:
+                yield tuple(row[i].strip() if i is not None else '' for i in indexes)
+
+def _articul_from_set_num(set_num):
+    """Converts a Rebrickable set number such as '75192-1' to the articul used in this database."""
+    return set_num[:-2] if set_num.endswith('-1') else set_num
+
+def _read_inventory_map(inventories_path):
+    """Maps Rebrickable inventory ids to articuls, keeping only the first version of each set."""
+    best = {} # set_num -> (version, inventory_id)
+    for inventory_id, version, set_num in _iter_csv(inventories_path, [('id',), ('version',), ('set_num',)], optional={1}):
+        version = int(version or 1)
+        if set_num not in best or version < best[set_num][0]:
+            best[set_num] = (version, inventory_id)
+    return {inventory_id: _articul_from_set_num(set_num) for set_num, (_, inventory_id) in best.items()}
+
+def _import_progress(state, progress):
+    """Returns an on_progress callback for _iter_csv that records the position in state and reports it."""
+    def on_progress(rows_read, bytes_read):
+        state['rows'], state['processed'] = rows_read, bytes_read
+        if progress:
+            progress(dict(state))
+    return on_progress
+
+def import_set_parts_csv(path, inventories_path=None, progress=None, stop_event=None):
+    """Bulk-loads set inventories from a Rebrickable-style CSV, replacing the inventories of the sets it contains.
+
+    Accepts either a 'set_num' column or Rebrickable's inventory_parts.csv with an 'inventory_id' column,
+    in which case inventories.csv (by default next to the file) maps inventories to sets.
+    progress, if given, is called with a dict of processed and total (bytes of the file) and rows read.
+    Returns that dict with imported, stopped and error set; a stopped import changes nothing.
+    """
+    stop_event = stop_event or threading.Event()
+    state = {'processed': 0, 'total': 0, 'rows': 0, 'imported': 0, 'stopped': False, 'error': None}
+    conn = None # Initialize conn to None
+    try:
+        state['total'] = os.path.getsize(path)
+        if inventories_path is None:
+            candidate = os.path.join(os.path.dirname(path), 'inventories.csv')
+            inventories_path = candidate if os.path.exists(candidate) else candidate + '.gz'
+        by_inventory = 'set_num' not in _csv_header(path)
+        inventory_map = _read_inventory_map(inventories_path) if by_inventory else None
+
+        def rows():
+            columns = [('inventory_id',) if by_inventory else ('set_num',), ('part_num',), ('color_id',), ('quantity',), ('is_spare',)]
+            for set_ref, part_num, color_id, quantity, is_spare in _iter_csv(path, columns, optional={4}, on_progress=_import_progress(state, progress)):
+                if stop_event.is_set():
+                    state['stopped'] = True
+                    return
+                if is_spare.lower() in ('t', 'true', '1'):
+                    continue
+                if by_inventory:
+                    articul = inventory_map.get(set_ref)
+                    if articul is None: # Not the first version of its set
+                        continue
+                else:
+                    articul = _articul_from_set_num(set_ref)
+                yield articul, part_num, int(color_id), int(quantity)
+
+        conn = sqlite3.connect(DATABASE_NAME)
+        cursor = conn.cursor()
+        # Stage the file first so duplicate lines are summed and re-imports replace instead of doubling
+        cursor.execute("CREATE TEMP TABLE import_set_parts (articul TEXT, part_num TEXT, color_id INTEGER, quantity INTEGER)")
+        cursor.executemany("INSERT INTO import_set_parts VALUES (?, ?, ?, ?)", rows())
+        if state['stopped']: # Closing without a commit discards the staged rows
+            return state
+        state['imported'] = cursor.rowcount
+        state['processed'] = state['total']
+        if progress:
+            progress(dict(state))
+        cursor.execute("CREATE TEMP TABLE import_sets AS SELECT DISTINCT articul FROM import_set_parts")
+        cursor.execute("DELETE FROM set_parts WHERE articul IN (SELECT articul FROM import_sets)")
+        cursor.execute("""INSERT INTO set_parts (articul, part_num, color_id, quantity)
+                          SELECT articul, part_num, color_id, SUM(quantity) FROM import_set_parts
+                          GROUP BY articul, part_num, color_id""")
+        # Refresh the precomputed per-set aggregates for the imported sets only
+        cursor.execute("DELETE FROM set_part_totals WHERE articul IN (SELECT articul FROM import_sets)")
+        cursor.execute("""INSERT INTO set_part_totals (articul, total_quantity, line_count, missing_quantity)
+                          SELECT sp.articul, SUM(sp.quantity), COUNT(*), SUM(MAX(sp.quantity - COALESCE(op.quantity, 0), 0))
+                          FROM set_parts sp
+                          LEFT JOIN owned_parts op ON op.part_num = sp.part_num AND op.color_id = sp.color_id
+                          WHERE sp.articul IN (SELECT articul FROM import_sets) GROUP BY sp.articul""")
+        _bump_collection_version(cursor)
+        conn.commit()
+        cursor.execute("ANALYZE set_parts")
+    except (OSError, KeyError, ValueError, csv.Error) as e:
+        state['error'] = f"Не вдалося прочитати файл {path}: {e}"
+        print(f"Error importing {path}: {e}")
+    except sqlite3.Error as e:
+        state['error'] = f"Виникла помилка під час імпорту деталей: {e}"
+        print(f"Database error importing {path}: {e}")
+    finally:
+        if conn:
+            conn.close()
+    return state
+
+def import_owned_parts_csv(path, replace=True, progress=None, stop_event=None):
+    """Bulk-loads the user's loose parts from a CSV with part/color/quantity columns.
+
+    Both 'part_num,color_id,quantity' and Rebrickable's 'Part,Color,Quantity' export are accepted.
+    With replace=True the file becomes the whole loose-parts list, otherwise quantities are added.
+    progress and the returned dict work as in import_set_parts_csv.
+    """
+    stop_event = stop_event or threading.Event()
+    state = {'processed': 0, 'total': 0, 'rows': 0, 'imported': 0, 'stopped': False, 'error': None}
+    conn = None # Initialize conn to None
+    try:
+        state['total'] = os.path.getsize(path)
+
+        def rows():
+            for part_num, color_id, quantity in _iter_csv(path, [('part_num', 'part'), ('color_id', 'color'), ('quantity',)],
+                                                          on_progress=_import_progress(state, progress)):
+                if stop_event.is_set():
+                    state['stopped'] = True
+                    return
+                yield part_num, int(color_id), int(quantity)
+
+        conn = sqlite3.connect(DATABASE_NAME)
+        cursor = conn.cursor()
+        # Parts owned before and after the import; only sets using one of them need their missing quantity refreshed
+        cursor.execute("CREATE TEMP TABLE import_changed_parts (part_num TEXT, color_id INTEGER, PRIMARY KEY (part_num, color_id)) WITHOUT ROWID")
+        cursor.execute("INSERT INTO import_changed_parts SELECT part_num, color_id FROM owned_parts")
+        if replace:
+            cursor.execute("DELETE FROM owned_parts")
+        cursor.executemany("""INSERT INTO owned_parts (part_num, color_id, quantity) VALUES (?, ?, ?)
+                              ON CONFLICT (part_num, color_id) DO UPDATE SET quantity = quantity + excluded.quantity""", rows())
+        if state['stopped']: # Closing without a commit keeps the previous parts list
+            return state
+        state['imported'] = cursor.rowcount
+        state['processed'] = state['total']
+        if progress:
+            progress(dict(state))
+        cursor.execute("INSERT OR IGNORE INTO import_changed_parts SELECT part_num, color_id FROM owned_parts")
+        # Set lookups by part go through the covering index on set_parts
+        _refresh_missing_quantities(cursor, """SELECT sp.articul FROM import_changed_parts c
+                                               JOIN set_parts sp ON sp.part_num = c.part_num AND sp.color_id = c.color_id""")
+        _bump_collection_version(cursor)
+        conn.commit()
+        cursor.execute("ANALYZE owned_parts")
+    except (OSError, KeyError, ValueError, csv.Error) as e:
+        state['error'] = f"Не вдалося прочитати файл {path}: {e}"
+        print(f"Error importing {path}: {e}")
+    except sqlite3.Error as e:
+        state['error'] = f"Виникла помилка під час імпорту деталей: {e}"
+        print(f"Database error importing {path}: {e}")
+    finally:
+        if conn:
+            conn.close()
+    return state
+
+def get_inventory_summary(articul):
+    """Returns (total_quantity, missing_quantity) for a set, or None if its inventory is unknown."""
+    conn = None # Initialize conn to None
+    try:
+        conn = sqlite3.connect(DATABASE_NAME)
+        cursor = conn.cursor()
+        cursor.execute("SELECT total_quantity, missing_quantity FROM set_part_totals WHERE articul = ?", (articul,))
+        return cursor.fetchone()
+    except sqlite3.Error as e:
+        print(f"Database error fetching inventory for {articul}: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+def get_missing_parts(articul):
+    """Returns (part_num, color_id, needed, owned) for every part of a set that is not fully covered by owned parts."""
+    conn = None # Initialize conn to None
+    try:
+        conn = sqlite3.connect(DATABASE_NAME)
+        cursor = conn.cursor()
+        cursor.execute("""SELECT sp.part_num, sp.color_id, sp.quantity, COALESCE(op.quantity, 0) AS owned
+                          FROM set_parts sp
+                          LEFT JOIN owned_parts op ON op.part_num = sp.part_num AND op.color_id = sp.color_id
+                          WHERE sp.articul = ? AND sp.quantity > COALESCE(op.quantity, 0)
+                          ORDER BY sp.part_num, sp.color_id""", (articul,))
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        messagebox.showerror("Помилка Бази Даних", f"Виникла помилка під час отримання деталей: {e}")
+        return []
+    finally:
+        if conn:
+            conn.close()
+
+# Add a User-Agent header to mimic a browser request
+_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36'
+
+class _ImageRequest:
+    """A single in-flight download that concurrent callers for the same URL wait on."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.image = None
+
+_image_lock = threading.Lock()
+_inflight_images = {} # url -> _ImageRequest currently being downloaded
+_decoded_images = OrderedDict() # url -> decoded original, most recently used last
+_decoded_bytes = 0 # Pixel memory held by _decoded_images
+image_fetch_stats = {'network_fetches': 0, 'coalesced': 0, 'memory_hits': 0}
+
+def _download_image(image_url):
+    """Downloads and decodes an image, returning None on failure."""
     try:
-        # Add a User-Agent header to mimic a browser request
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36'
-        }
-        response = requests.get(image_url, stream=True, headers=headers)
+        response = requests.get(image_url, stream=True, headers={'User-Agent': _USER_AGENT}, timeout=IMAGE_TIMEOUT)
         response.raise_for_status() # Raise an exception for bad status codes
         image_data = response.content
+        from PIL import Image # Pillow is only needed to create thumbnails, not to show cached ones
         img = Image.open(io.BytesIO(image_data))
-        img = img.resize(size, Image.Resampling.LANCZOS)
-        return ImageTk.PhotoImage(img)
+        img.load() # Decode now so every caller shares the decoded pixels
+        return img
     except requests.exceptions.RequestException as e:
         print(f"Error downloading image from {image_url}: {e}")
         return None
@@ -189,6 +647,888 @@ def get_image_from_url(image_url, size=(150, 150)):
         print(f"Error processing image from {image_url}: {e}")
         return None
 
+def _decoded_size(img):
+    return img.width * img.height * len(img.getbands())
+
+def fetch_original_image(image_url):
+    """Returns the decoded original image for a URL, sharing one download between concurrent callers."""
+    global _decoded_bytes
+    with _image_lock:
+        if image_url in _decoded_images:
+            _decoded_images.move_to_end(image_url)
+            image_fetch_stats['memory_hits'] += 1
+            return _decoded_images[image_url]
+        request = _inflight_images.get(image_url)
+        owner = request is None
+        if owner:
+            request = _ImageRequest()
+            _inflight_images[image_url] = request
+            image_fetch_stats['network_fetches'] += 1
+        else:
+            image_fetch_stats['coalesced'] += 1
+
+    if not owner:
+        request.done.wait()
+        return request.image
+
+    try:
+        request.image = _download_image(image_url)
+    finally:
+        with _image_lock:
+            del _inflight_images[image_url]
+            # A picture larger than the whole budget is handed to its callers but not kept
+            if request.image is not None and _decoded_size(request.image) <= DECODED_IMAGE_CACHE_BYTES:
+                _decoded_images[image_url] = request.image
+                _decoded_bytes += _decoded_size(request.image)
+                while _decoded_bytes > DECODED_IMAGE_CACHE_BYTES:
+                    _decoded_bytes -= _decoded_size(_decoded_images.popitem(last=False)[1])
+        request.done.set()
+    return request.image
+
+def _thumbnail_path(image_url, size):
+    """Returns the disk cache path of the thumbnail of a URL at the given size."""
+    digest = hashlib.sha1(image_url.encode('utf-8')).hexdigest()
+    return os.path.join(IMAGE_CACHE_DIR, f"{digest}_{size[0]}x{size[1]}.png")
+
+def save_thumbnail(image_url, size, img):
+    """Encodes a thumbnail as PNG and writes it to the disk cache; returns the PNG bytes.
+
+    The rename makes the file appear atomically to readers.
+    """
+    if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'): # e.g. CMYK JPEGs cannot be stored as PNG
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG')
+    data = buffer.getvalue()
+    path = _thumbnail_path(image_url, size)
+    try:
+        os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Error caching thumbnail for {image_url}: {e}")
+    return data
+
+def _resize_and_cache(image_url, size, original):
+    from PIL import Image
+    try:
+        return save_thumbnail(image_url, size, original.resize(size, Image.Resampling.LANCZOS))
+    except Exception as e:
+        print(f"Error processing image from {image_url}: {e}")
+        return None
+
+def load_thumbnail_data(image_url, size=(150, 150), download=True):
+    """Returns the PNG thumbnail of a URL, ready for tk.PhotoImage(data=...), or None.
+
+    Cached thumbnails are read from disk as-is; Pillow only runs when a thumbnail has to be created.
+    With download=False only the disk cache is consulted. Safe to call from worker threads.
+    """
+    try:
+        with open(_thumbnail_path(image_url, size), 'rb') as f:
+            data = f.read()
+        if data.startswith(PNG_SIGNATURE):
+            return data
+        print(f"Damaged cached thumbnail for {image_url}, rebuilding it")
+    except OSError: # Missing, or unreadable: rebuild it like a damaged one
+        pass
+    if not download:
+        return None
+    original = fetch_original_image(image_url)
+    if original is None:
+        return None
+    return _resize_and_cache(image_url, size, original)
+
+def discard_thumbnail(image_url, size):
+    """Removes a cached thumbnail Tk could not display, so it is rebuilt next time."""
+    try:
+        os.remove(_thumbnail_path(image_url, size))
+    except OSError:
+        pass
+
+def get_image_fetch_stats():
+    """Returns a snapshot of the image fetch counters, including how many downloads were saved."""
+    with _image_lock:
+        stats = dict(image_fetch_stats)
+    stats['saved_fetches'] = stats['coalesced'] + stats['memory_hits']
+    return stats
+
+class _RateLimiter:
+    """Spaces out requests to stay under a global and a per-host rate (requests per second)."""
+    def __init__(self, rate, per_host_rate):
+        self.interval = 1.0 / rate
+        self.host_interval = 1.0 / per_host_rate
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+        self.next_host_slot = {} # host -> earliest time of its next request
+
+    def wait(self, host, stop_event):
+        """Blocks until a request to host may be sent; returns False if stop_event was set meanwhile.
+
+        Slots are only taken once both limits allow a request, so a request held back by its own busy
+        host never delays requests to other hosts.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                ready = max(self.next_slot, self.next_host_slot.get(host, 0.0))
+                if ready <= now:
+                    self.next_slot = now + self.interval
+                    self.next_host_slot[host] = now + self.host_interval
+                    return True
+            if stop_event.wait(ready - now):
+                return False
+
+def _warm_url(image_url, limiter, stop_event):
+    """Creates any missing thumbnails of a URL. Returns True on success, False on failure, None if stopped."""
+    missing = [size for size in THUMBNAIL_SIZES if not os.path.exists(_thumbnail_path(image_url, size))]
+    if not missing:
+        return True
+    if not limiter.wait(urlparse(image_url).netloc, stop_event):
+        return None
+    original = fetch_original_image(image_url)
+    if original is None:
+        return False
+    return all(_resize_and_cache(image_url, size, original) is not None for size in missing)
+
+def _save_warm_checkpoint(conn, last_url, processed, failed):
+    conn.execute("INSERT OR REPLACE INTO cache_warm_state (job, last_url, processed, failed, updated_at) VALUES ('images', ?, ?, ?, ?)",
+                 (last_url, processed, failed, time.time()))
+    conn.commit()
+
+def warm_image_cache(progress=None, stop_event=None, rate=WARM_CACHE_RATE, per_host_rate=WARM_CACHE_PER_HOST_RATE, workers=IMAGE_WORKERS):
+    """Fetches and thumbnails every picture URL in the collection at the sizes the app uses.
+
+    Progress is checkpointed after every batch so an interrupted run resumes where it stopped.
+    progress, if given, is called from this thread with a dict of processed, total, failed and eta
+    (seconds, or None). Returns that same dict for the final state, with 'stopped' set if cancelled.
+    """
+    stop_event = stop_event or threading.Event()
+    limiter = _RateLimiter(rate, per_host_rate)
+    conn = None # Initialize conn to None
+    state = {'processed': 0, 'total': 0, 'failed': 0, 'eta': None, 'stopped': False}
+    try:
+        conn = sqlite3.connect(DATABASE_NAME)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(DISTINCT picture) FROM legos WHERE picture IS NOT NULL AND picture != ''")
+        state['total'] = cursor.fetchone()[0]
+        checkpoint = cursor.execute("SELECT last_url, processed, failed FROM cache_warm_state WHERE job = 'images'").fetchone()
+        last_url, state['processed'], state['failed'] = checkpoint if checkpoint else ('', 0, 0)
+
+        urls = conn.cursor() # Separate cursor: checkpoints are committed while it is being read
+        urls.execute("SELECT DISTINCT picture FROM legos WHERE picture > ? ORDER BY picture", (last_url,))
+        started = time.monotonic()
+        processed_this_run = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                while not stop_event.is_set():
+                    batch = [row[0] for row in urls.fetchmany(WARM_CACHE_BATCH)]
+                    if not batch:
+                        break
+                    results = list(executor.map(lambda url: _warm_url(url, limiter, stop_event), batch))
+                    if None in results: # Stopped mid-batch: keep the old checkpoint, finished files are skipped next time
+                        break
+                    processed_this_run += len(batch)
+                    state['processed'] += len(batch)
+                    state['failed'] += results.count(False)
+                    remaining = max(0, state['total'] - state['processed'])
+                    state['eta'] = (time.monotonic() - started) / processed_this_run * remaining
+                    _save_warm_checkpoint(conn, batch[-1], state['processed'], state['failed'])
+                    if progress:
+                        progress(dict(state))
+            except KeyboardInterrupt:
+                # Workers waiting for a rate-limit slot give up at once instead of
+                # finishing the batch while the executor shuts down
+                stop_event.set()
+                raise
+
+        if stop_event.is_set():
+            state['stopped'] = True
+        else: # Finished: the next run walks the collection again to pick up new sets
+            conn.execute("DELETE FROM cache_warm_state WHERE job = 'images'")
+            conn.commit()
+            state['eta'] = 0
+    except sqlite3.Error as e:
+        print(f"Database error while warming the image cache: {e}")
+    finally:
+        if conn:
+            conn.close()
+    return state
+
+_SSL_CONTEXT = ssl.create_default_context()
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+def _parse_response_head(head):
+    """Splits a raw HTTP response head into (status, headers with lower-case names)."""
+    status_line, *header_lines = head.decode('latin-1').split("\r\n")
+    headers = {}
+    for line in header_lines:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return int(status_line.split()[1]), headers
+
+def _host_header(parts, always_port=False):
+    """Returns host[:port] of a split URL, without any user:password@ part."""
+    host = f"[{parts.hostname}]" if ':' in parts.hostname else parts.hostname # IPv6 literals keep their brackets
+    port = parts.port
+    if always_port and not port:
+        port = 443 if parts.scheme == 'https' else 80
+    return f"{host}:{port}" if port else host
+
+async def _close_writer(writer, timeout):
+    writer.close()
+    try:
+        await asyncio.wait_for(writer.wait_closed(), timeout)
+    except (OSError, asyncio.TimeoutError): # The response is already read, a messy close doesn't change it
+        pass
+
+async def _open_probe_connection(url, parts, timeout):
+    """Connects for a probe of url, through the HTTP(S)_PROXY that requests would use for it (NO_PROXY is honoured).
+
+    Returns (reader, writer, request target, extra request headers).
+    """
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+    proxy = select_proxy(url, get_environ_proxies(url))
+    if not proxy:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=_SSL_CONTEXT if secure else None), timeout)
+        return reader, writer, target, ''
+
+    proxy_parts = urlsplit(proxy if '://' in proxy else f"http://{proxy}")
+    if proxy_parts.scheme != 'http' or not proxy_parts.hostname:
+        raise ValueError(f"unsupported proxy: {proxy}")
+    proxy_headers = ''
+    if proxy_parts.username:
+        credentials = f"{unquote(proxy_parts.username)}:{unquote(proxy_parts.password or '')}"
+        proxy_headers = f"Proxy-Authorization: Basic {base64.b64encode(credentials.encode('utf-8')).decode('ascii')}\r\n"
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(proxy_parts.hostname, proxy_parts.port or 80), timeout)
+    if not secure: # Plain HTTP goes to the proxy with the absolute URL as target
+        return reader, writer, f"http://{_host_header(parts)}{target}", proxy_headers
+
+    # HTTPS is tunnelled with CONNECT, then TLS is negotiated with the target host through the tunnel
+    try:
+        authority = _host_header(parts, always_port=True)
+        writer.write(f"CONNECT {authority} HTTP/1.1\r\nHost: {authority}\r\n{proxy_headers}\r\n".encode('ascii'))
+        await asyncio.wait_for(writer.drain(), timeout)
+        status, _ = _parse_response_head(await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout))
+        if not 200 <= status < 300:
+            raise OSError(f"proxy refused CONNECT with status {status}")
+        await asyncio.wait_for(writer.start_tls(_SSL_CONTEXT, server_hostname=parts.hostname), timeout) # Python 3.11+
+    except BaseException:
+        await _close_writer(writer, timeout)
+        raise
+    return reader, writer, target, ''
+
+async def _http_probe(url, method, timeout, max_redirects=5):
+    """Sends a HEAD or single-byte ranged GET and returns (status, headers) without reading a body."""
+    for _ in range(max_redirects + 1):
+        parts = urlsplit(requote_uri(url))
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"unsupported URL: {url}")
+        reader, writer, target, extra_headers = await _open_probe_connection(url, parts, timeout)
+        try:
+            request = (f"{method} {target} HTTP/1.1\r\nHost: {_host_header(parts)}\r\nUser-Agent: {_USER_AGENT}\r\n"
+                       f"Accept: image/*\r\nConnection: close\r\n{extra_headers}")
+            if method == 'GET':
+                request += "Range: bytes=0-0\r\n"
+            writer.write((request + "\r\n").encode('ascii'))
+            await asyncio.wait_for(writer.drain(), timeout)
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        finally:
+            await _close_writer(writer, timeout)
+        status, headers = _parse_response_head(head)
+        if status in _REDIRECT_STATUSES and 'location' in headers:
+            url = urljoin(url, headers['location'])
+            continue
+        return status, headers
+    raise ValueError("too many redirects")
+
+async def _check_url(url, overall, host_limits, timeout):
+    """Probes one picture URL and returns its image_health row."""
+    # Host slot first, so requests queued behind a busy host don't hold overall slots
+    async with host_limits[urlsplit(url).hostname], overall:
+        started = time.perf_counter()
+        try:
+            status, headers = await _http_probe(url, 'HEAD', timeout)
+            if status >= 400 and status not in (404, 410): # Some servers reject HEAD but serve GET
+                status, headers = await _http_probe(url, 'GET', timeout)
+            size = headers.get('content-length')
+            if 'content-range' in headers: # "bytes 0-0/12345" carries the full size of a ranged GET
+                size = headers['content-range'].rpartition('/')[2]
+            content_type = headers.get('content-type', '').split(';')[0].strip() or None
+            return (url, status, (time.perf_counter() - started) * 1000, content_type,
+                    int(size) if size and size.isdigit() else None, None, time.time())
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, IndexError) as e:
+            return (url, None, (time.perf_counter() - started) * 1000, None, None, str(e) or type(e).__name__, time.time())
+
+def _image_health(status, content_type):
+    """Classifies one link check result the same way as IMAGE_OK_SQL, IMAGE_DEAD_SQL and IMAGE_FAILED_SQL."""
+    if status is None or status >= 500:
+        return 'failed'
+    if status >= 400 or (content_type or '').startswith('text/'):
+        return 'dead'
+    return 'ok'
+
+def _save_image_health(conn, rows):
+    conn.executemany("INSERT OR REPLACE INTO image_health (url, status, latency_ms, content_type, content_length, error, checked_at) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    _bump_collection_version(conn.cursor())
+    conn.commit()
+
+async def _check_urls(urls, conn, progress, stop_event, concurrency, per_host, timeout):
+    overall = asyncio.Semaphore(concurrency)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(per_host))
+    state = {'processed': 0, 'total': len(urls), 'dead': 0, 'failed': 0, 'stopped': False}
+    tasks = [asyncio.ensure_future(_check_url(url, overall, host_limits, timeout)) for url in urls]
+    pending_rows = []
+    try:
+        for finished in asyncio.as_completed(tasks):
+            row = await finished
+            pending_rows.append(row)
+            state['processed'] += 1
+            health = _image_health(row[1], row[3])
+            if health != 'ok':
+                state[health] += 1
+            if len(pending_rows) >= 100 or state['processed'] == state['total']:
+                _save_image_health(conn, pending_rows)
+                pending_rows = []
+                if progress:
+                    progress(dict(state))
+            if stop_event.is_set():
+                state['stopped'] = True
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+        if pending_rows: # Keep results gathered before a stop
+            _save_image_health(conn, pending_rows)
+    return state
+
+def check_picture_urls(progress=None, stop_event=None, concurrency=LINK_CHECK_CONCURRENCY, per_host=LINK_CHECK_PER_HOST, timeout=LINK_CHECK_TIMEOUT):
+    """Checks every picture URL in the collection concurrently and records the results in image_health.
+
+    progress, if given, is called with a dict of processed, total, dead and failed. Returns the final dict,
+    with 'stopped' set if stop_event interrupted the run.
+    """
+    stop_event = stop_event or threading.Event()
+    conn = None # Initialize conn to None
+    try:
+        conn = sqlite3.connect(DATABASE_NAME)
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT picture FROM legos WHERE picture IS NOT NULL AND picture != ''")
+        urls = [row[0] for row in cursor.fetchall()]
+        return asyncio.run(_check_urls(urls, conn, progress, stop_event, concurrency, per_host, timeout))
+    except sqlite3.Error as e:
+        print(f"Database error while checking pictures: {e}")
+        return {'processed': 0, 'total': 0, 'dead': 0, 'failed': 0, 'stopped': True}
+    finally:
+        if conn:
+            conn.close()
+
+def get_dead_picture_urls():
+    """Returns the set of picture URLs the link checker found gone or not to be images (not those that timed out)."""
+    conn = None # Initialize conn to None
+    try:
+        conn = sqlite3.connect(DATABASE_NAME)
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT url FROM image_health WHERE {IMAGE_DEAD_SQL}")
+        return {row[0] for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        print(f"Database error fetching picture health: {e}")
+        return set()
+    finally:
+        if conn:
+            conn.close()
+
+def export_legos(path, filters=None, progress=None, stop_event=None):
+    """Streams the LEGOs matching the search filters to a file without loading them into memory.
+
+    The format follows the file name: .jsonl writes JSON Lines, anything else CSV, and a trailing .gz
+    compresses the output. The file only appears once the export is complete; a cancelled or failed
+    export leaves nothing behind. Returns a dict of processed, total, stopped and error.
+    """
+    stop_event = stop_event or threading.Event()
+    state = {'processed': 0, 'total': 0, 'stopped': False, 'error': None}
+    compress = path.endswith('.gz')
+    json_lines = (path[:-3] if compress else path).endswith('.jsonl')
+    temp_path = path + '.part'
+    conn = None # Initialize conn to None
+    try:
+        conn = sqlite3.connect(DATABASE_NAME)
+        cursor = conn.cursor()
+        where, params = build_search_filter(**(filters or {}))
+        state['total'] = cursor.execute(f"SELECT COUNT(*) FROM legos WHERE {where}", params).fetchone()[0]
+        # SQLite steps the statement as rows are fetched, so only one batch is in memory at a time
+        cursor.execute(f"SELECT {', '.join(LEGO_COLUMNS)} FROM legos WHERE {where} ORDER BY articul", params)
+
+        with (gzip.open(temp_path, 'wt', encoding='utf-8', newline='') if compress
+              else open(temp_path, 'w', encoding='utf-8', newline='')) as f:
+            writer = None if json_lines else csv.writer(f)
+            if writer:
+                writer.writerow(LEGO_COLUMNS)
+            while not stop_event.is_set():
+                rows = cursor.fetchmany(EXPORT_BATCH)
+                if not rows:
+                    break
+                if writer:
+                    writer.writerows(rows)
+                else:
+                    f.writelines(json.dumps(dict(zip(LEGO_COLUMNS, row)), ensure_ascii=False) + '\n' for row in rows)
+                state['processed'] += len(rows)
+                if progress:
+                    progress(dict(state))
+
+        if stop_event.is_set():
+            state['stopped'] = True
+        else:
+            os.replace(temp_path, path)
+    except (sqlite3.Error, OSError) as e:
+        state['error'] = str(e)
+        print(f"Error exporting to {path}: {e}")
+    finally:
+        if conn:
+            conn.close()
+        if os.path.exists(temp_path): # Cancelled, failed or interrupted
+            os.remove(temp_path)
+    return state
+
+def benchmark_display_path(samples=BENCHMARK_SAMPLES):
+    """Compares main-thread time per gallery card of the Pillow display path against Tk-native thumbnails.
+
+    In the Pillow path the picture is decoded and resized on a worker thread, so the main thread only
+    converts the finished thumbnail with ImageTk.PhotoImage. The cached path hands pre-encoded PNG (and,
+    for comparison, PPM) bytes straight to tk.PhotoImage. Needs a display. Returns milliseconds per card by path.
+    """
+    from PIL import Image, ImageTk
+    root = tk.Tk()
+    root.withdraw()
+    try:
+        # A photo-like source picture, decoded and resized as a worker thread hands it over
+        source = Image.effect_mandelbrot((800, 600), (-2.0, -1.2, 1.0, 1.2), 100).convert('RGB')
+        thumbnail = source.resize((200, 150), Image.Resampling.LANCZOS)
+        encoded = {}
+        for fmt in ('PNG', 'PPM'):
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, fmt)
+            encoded[fmt] = buffer.getvalue()
+
+        paths = {'decoded thumbnail -> ImageTk.PhotoImage': lambda: ImageTk.PhotoImage(thumbnail),
+                 'cached PNG -> tk.PhotoImage': lambda: tk.PhotoImage(data=encoded['PNG']),
+                 'cached PPM -> tk.PhotoImage': lambda: tk.PhotoImage(data=encoded['PPM'])}
+        results = {}
+        for name, make_card in paths.items():
+            make_card() # Warm up
+            timings = []
+            for _ in range(samples):
+                started = time.perf_counter()
+                make_card()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            results[name] = timings[len(timings) // 2]
+        return results
+    finally:
+        root.destroy()
+
+def _format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes:02d}:{seconds:02d}"
+
+class _DatabaseWriter:
+    """Runs all API writes on one thread with one connection, so writers never contend for the lock."""
+    def __init__(self):
+        self.tasks = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        conn = sqlite3.connect(DATABASE_NAME)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        while True:
+            func, future = self.tasks.get()
+            if func is None:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = func(conn)
+                conn.commit()
+                future.set_result(result)
+            except Exception as e:
+                conn.rollback()
+                future.set_exception(e)
+        conn.close()
+
+    def submit(self, func):
+        """Queues func(conn) as one transaction and returns a Future with its result."""
+        future = Future()
+        self.tasks.put((func, future))
+        return future
+
+    def close(self):
+        self.tasks.put((None, None))
+        self.thread.join()
+
+def _lego_to_json(row):
+    return dict(zip(LEGO_COLUMNS, row))
+
+def _parse_search_params(query):
+    """Converts API query parameters into search_legos_in_db keyword arguments; raises ValueError on bad input."""
+    def get(name):
+        values = query.get(name)
+        return values[-1] if values else None
+
+    def flag(name):
+        value = get(name)
+        if value is None:
+            return None
+        if value.lower() in ('1', 'true', 'yes'):
+            return True
+        if value.lower() in ('0', 'false', 'no'):
+            return False
+        raise ValueError(f"{name} must be true or false")
+
+    filters = {'articul': get('articul'), 'name': get('name'), 'series': get('series'),
+               'favorite_only': flag('favorite_only'), 'buildable': flag('buildable')}
+    for name in ('min_part_count', 'max_part_count', 'all_parts'):
+        value = get(name)
+        filters[name] = int(value) if value is not None else None
+    if filters['all_parts'] not in (None, 0, 1):
+        raise ValueError("all_parts must be 0 or 1")
+    filters['image_health'] = get('image_health')
+    if filters['image_health'] not in (None, 'ok', 'dead', 'failed', 'unchecked'):
+        raise ValueError("image_health must be ok, dead, failed or unchecked")
+    return filters
+
+def _parse_lego_json(item):
+    """Validates one bulk upsert item and returns its column values in LEGO_COLUMNS order."""
+    if not isinstance(item, dict) or not item.get('articul') or not item.get('name'):
+        raise ValueError("every item needs articul and name")
+    # Checked before str() below, which would turn any JSON value into some text
+    if isinstance(item['articul'], bool) or not isinstance(item['articul'], (str, int)):
+        raise ValueError("articul must be a string or an integer")
+    if not isinstance(item['name'], str):
+        raise ValueError(f"name of {item['articul']} must be a string")
+    for name in ('picture', 'series'):
+        if not isinstance(item.get(name), (str, type(None))):
+            raise ValueError(f"{name} of {item['articul']} must be a string or null")
+    part_count = item.get('part_count')
+    all_parts = item.get('all_parts')
+    favorite = item.get('favorite', 0)
+    if part_count is not None and not isinstance(part_count, int):
+        raise ValueError(f"part_count of {item['articul']} must be an integer")
+    if all_parts not in (None, 0, 1) or favorite not in (0, 1):
+        raise ValueError(f"all_parts and favorite of {item['articul']} must be 0 or 1")
+    return (str(item['articul']), str(item['name']), part_count, all_parts,
+            item.get('picture') or '', item.get('series') or '', favorite)
+
+def _bulk_write(upserts, deletes):
+    def write(conn):
+        cursor = conn.cursor()
+        cursor.executemany(f"""INSERT INTO legos ({', '.join(LEGO_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)
+                               ON CONFLICT (articul) DO UPDATE SET name = excluded.name, part_count = excluded.part_count,
+                               all_parts = excluded.all_parts, picture = excluded.picture, series = excluded.series,
+                               favorite = excluded.favorite""", upserts)
+        upserted = cursor.rowcount if upserts else 0
+        cursor.executemany("DELETE FROM legos WHERE articul = ?", [(articul,) for articul in deletes])
+        deleted = cursor.rowcount if deletes else 0
+        return {'upserted': upserted, 'deleted': deleted}
+    return write
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over the collection. Reads use a connection owned by the handling thread."""
+    server_version = "LegoDatabase"
+    protocol_version = "HTTP/1.1" # Keep-alive makes repeated polling cheaper
+
+    def _read_conn(self):
+        local = self.server.local
+        if getattr(local, 'conn', None) is None:
+            local.conn = sqlite3.connect(f"file:{DATABASE_NAME}?mode=ro", uri=True)
+        return local.conn
+
+    def finish(self):
+        conn = getattr(self.server.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.server.local.conn = None
+        super().finish()
+
+    def log_message(self, format, *args):
+        pass # Keep the console quiet while tools poll
+
+    def _send_json(self, status, payload, etag=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache') # Clients revalidate with If-None-Match
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_modified(self, etag):
+        """Answers 304 if the client already has this version; only called once the response would be a 200."""
+        if etag not in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return True
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        try:
+            conn = self._read_conn()
+            # All responses derive from the collection, so one counter read decides whether anything changed
+            version = conn.execute("SELECT version FROM collection_version WHERE id = 1").fetchone()[0]
+            etag = f'"{version}"'
+
+            if parts.path == '/api/legos':
+                query = parse_qs(parts.query)
+                filters = _parse_search_params(query)
+                limit = min(int(query.get('limit', [API_PAGE_SIZE])[-1]), API_MAX_PAGE_SIZE)
+                offset = int(query.get('offset', [0])[-1])
+                if limit < 1 or offset < 0:
+                    raise ValueError("limit must be positive and offset not negative")
+                if self._not_modified(etag): # Checked after validation so bad requests still get their 400
+                    return
+                where, params = build_search_filter(**filters)
+                total = conn.execute(f"SELECT COUNT(*) FROM legos WHERE {where}", params).fetchone()[0]
+                rows = conn.execute(f"SELECT {', '.join(LEGO_COLUMNS)} FROM legos WHERE {where} ORDER BY articul LIMIT ? OFFSET ?",
+                                    params + [limit, offset]).fetchall()
+                self._send_json(200, {'items': [_lego_to_json(row) for row in rows], 'total': total, 'limit': limit, 'offset': offset}, etag)
+            elif parts.path.startswith('/api/legos/'):
+                articul = unquote(parts.path[len('/api/legos/'):])
+                row = conn.execute(f"SELECT {', '.join(LEGO_COLUMNS)} FROM legos WHERE articul = ?", (articul,)).fetchone()
+                if row is None:
+                    self._send_json(404, {'error': f"LEGO {articul} not found"})
+                elif not self._not_modified(etag):
+                    self._send_json(200, _lego_to_json(row), etag)
+            elif parts.path == '/api/stats':
+                if self._not_modified(etag):
+                    return
+                total_count, total_parts, favorites = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(part_count), 0), COALESCE(SUM(favorite = 1), 0) FROM legos").fetchone()
+                series = conn.execute("SELECT series, COUNT(*) FROM legos WHERE series IS NOT NULL AND series != '' GROUP BY series ORDER BY series").fetchall()
+                self._send_json(200, {'total_sets': total_count, 'total_parts': total_parts, 'favorites': favorites,
+                                      'series': dict(series)}, etag)
+            else:
+                self._send_json(404, {'error': "unknown endpoint"})
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+        except sqlite3.Error as e:
+            self._send_json(500, {'error': f"database error: {e}"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/api/legos/bulk':
+            self._send_json(404, {'error': "unknown endpoint"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(payload, dict):
+                raise ValueError("body must be a JSON object")
+            if not isinstance(payload.get('upsert', []), list) or not isinstance(payload.get('delete', []), list):
+                raise ValueError("upsert and delete must be lists")
+            upserts = [_parse_lego_json(item) for item in payload.get('upsert', [])]
+            deletes = [str(articul) for articul in payload.get('delete', [])]
+            result = self.server.writer.submit(_bulk_write(upserts, deletes)).result()
+            self._send_json(200, result)
+        except (ValueError, TypeError) as e: # Includes malformed JSON and values of the wrong type
+            self._send_json(400, {'error': str(e)})
+        except sqlite3.IntegrityError as e:
+            self._send_json(409, {'error': str(e)})
+        except sqlite3.Error as e:
+            self._send_json(500, {'error': f"database error: {e}"})
+
+def serve_api(host=API_HOST, port=API_PORT):
+    """Serves the collection as a JSON API until interrupted.
+
+    GET /api/legos (search filters as query parameters, plus limit and offset), GET /api/legos/<articul>,
+    GET /api/stats and POST /api/legos/bulk with {"upsert": [...], "delete": [...]}.
+    """
+    conn = sqlite3.connect(DATABASE_NAME)
+    # WAL lets the API readers, its writer and the Tk app use the file at the same time
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+
+    server = ThreadingHTTPServer((host, port), _ApiHandler)
+    server.daemon_threads = True
+    server.local = threading.local()
+    server.writer = _DatabaseWriter()
+    print(f"Serving the LEGO database on http://{host}:{port}/api/legos")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.writer.close()
+
+class GalleryCanvas:
+    """Gallery that draws every card as a few Canvas items instead of a tree of widgets.
+
+    The column count follows the window width, only cards in or near the visible rows exist as
+    items, and clicks are mapped to cards arithmetically from the pointer position.
+    """
+    CARD_WIDTH = 220
+    CARD_HEIGHT = 260
+    GAP = 10
+    IMAGE_SIZE = (200, 150)
+    BUFFER_ROWS = 2 # Rows kept drawn above and below the visible ones
+    PHOTO_CACHE_SIZE = 100 # Recently shown pictures kept, so scrolling back doesn't decode them again
+
+    def __init__(self, app, window, legos, highlight_favorites=True):
+        self.app = app
+        self.legos = legos
+        self.highlight_favorites = highlight_favorites
+        self.columns = 0
+        self.drawn = {} # card index -> id of its background rectangle
+        self.photos = {} # card index -> PhotoImage, referenced while the card is drawn
+        self.photo_cache = OrderedDict() # card index -> PhotoImage, most recently shown last
+        self.waiting = set() # Status items of drawn cards whose picture is still loading; read by worker threads
+        self.selected = None
+
+        self.canvas = tk.Canvas(window, bg=BG_COLOR, highlightthickness=0)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(window, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        # Called by Tk whenever the view moves or resizes, which is exactly when new cards may show up
+        self.canvas.configure(yscrollcommand=self._on_view_change)
+        window.grid_columnconfigure(0, weight=1)
+        window.grid_rowconfigure(0, weight=1)
+
+        self.canvas.bind("<Configure>", self._on_resize)
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<Double-Button-1>", self._on_double_click)
+        self.canvas.bind("<Destroy>", lambda e: self.waiting.clear()) # Queued picture jobs for a closed window are skipped
+        # Bound on the window rather than bind_all, so the bindings disappear with it
+        window.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(int(-1*(e.delta/120)), "units"))
+        window.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        window.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+
+    def _card_origin(self, index):
+        row, column = divmod(index, self.columns)
+        return (self.GAP + column * (self.CARD_WIDTH + self.GAP),
+                self.GAP + row * (self.CARD_HEIGHT + self.GAP))
+
+    def _on_resize(self, event):
+        columns = max(1, (event.width - self.GAP) // (self.CARD_WIDTH + self.GAP))
+        if columns == self.columns:
+            return
+        self.columns = columns
+        rows = -(-len(self.legos) // columns)
+        self.canvas.configure(scrollregion=(0, 0, self.GAP + columns * (self.CARD_WIDTH + self.GAP),
+                                            self.GAP + rows * (self.CARD_HEIGHT + self.GAP)))
+        # Re-flow only the cards that exist; the rest are placed when they are first drawn
+        for index, rect in self.drawn.items():
+            x, y = self._card_origin(index)
+            left, top = self.canvas.coords(rect)[:2]
+            self.canvas.move(f"card{index}", x - left, y - top)
+        self._update_visible()
+
+    def _on_view_change(self, first, last):
+        self.scrollbar.set(first, last)
+        self._update_visible()
+
+    def _update_visible(self):
+        """Draws the cards around the visible rows and deletes those that scrolled far away."""
+        if not self.columns:
+            return
+        row_height = self.CARD_HEIGHT + self.GAP
+        first_row = max(0, int(self.canvas.canvasy(0) // row_height) - self.BUFFER_ROWS)
+        last_row = int(self.canvas.canvasy(self.canvas.winfo_height()) // row_height) + self.BUFFER_ROWS
+        first_index = first_row * self.columns
+        last_index = min(len(self.legos), (last_row + 1) * self.columns)
+        for index in [index for index in self.drawn if not first_index <= index < last_index]:
+            self.waiting.difference_update(self.canvas.find_withtag(f"card{index}"))
+            self.canvas.delete(f"card{index}")
+            del self.drawn[index]
+            self.photos.pop(index, None)
+        for index in range(first_index, last_index):
+            if index not in self.drawn:
+                self._draw_card(index)
+
+    def _draw_card(self, index):
+        articul, name, part_count, all_parts, picture, series, favorite = self.legos[index]
+        x, y = self._card_origin(index)
+        tags = (f"card{index}",)
+        center = x + self.CARD_WIDTH / 2
+        fill = FAVORITE_BG_COLOR if self.highlight_favorites and favorite == 1 else FRAME_COLOR
+
+        self.drawn[index] = self.canvas.create_rectangle(x, y, x + self.CARD_WIDTH, y + self.CARD_HEIGHT, fill=fill,
+                                                         outline=CARD_OUTLINE_COLOR, width=3 if index == self.selected else 1, tags=tags)
+        self.canvas.create_text(center, y + 6, text=f"{name} ({articul})", width=self.CARD_WIDTH - 10, anchor=tk.N,
+                                fill=TEXT_COLOR, font=("TkDefaultFont", 9, "bold"), tags=tags)
+        image_center_y = y + 40 + self.IMAGE_SIZE[1] / 2
+        if index in self.photo_cache:
+            self.photo_cache.move_to_end(index)
+            self.photos[index] = self.photo_cache[index]
+            self.canvas.create_image(center, image_center_y, image=self.photos[index], tags=tags)
+        elif picture:
+            status = self.canvas.create_text(center, image_center_y, text="Завантаження зображення...", width=self.CARD_WIDTH - 20,
+                                             fill=TEXT_COLOR, tags=tags)
+            self.waiting.add(status)
+            # Set membership is safe to test from the worker, which skips cards deleted while their job was queued
+            self.app.request_photo(picture, self.IMAGE_SIZE, lambda photo: self._show_photo(index, status, photo), lambda: status in self.waiting)
+        else:
+            self.canvas.create_text(center, image_center_y, text="Зображення відсутнє", width=self.CARD_WIDTH - 20, fill=TEXT_COLOR, tags=tags)
+
+        all_parts_str = 'Так' if all_parts == 1 else 'Ні' if all_parts == 0 else 'N/A'
+        self.canvas.create_text(x + 10, y + 50 + self.IMAGE_SIZE[1], anchor=tk.NW, fill=TEXT_COLOR, tags=tags,
+                                text=f"Серія: {series if series else 'N/A'}\n"
+                                     f"Деталі: {part_count if part_count is not None else 'N/A'}\n"
+                                     f"Всі деталі: {all_parts_str}")
+
+    def _show_photo(self, index, status, photo):
+        if status not in self.waiting: # The card scrolled away before its picture arrived
+            return
+        self.waiting.discard(status)
+        if photo is None:
+            self.canvas.itemconfigure(status, text="Помилка завантаження зображення")
+            return
+        # The status text sits where the picture goes, even if the card was re-flowed meanwhile
+        center_x, center_y = self.canvas.coords(status)
+        self.canvas.create_image(center_x, center_y, image=photo, tags=(f"card{index}",))
+        self.canvas.delete(status)
+        self.photos[index] = photo
+        self.photo_cache[index] = photo
+        while len(self.photo_cache) > self.PHOTO_CACHE_SIZE:
+            self.photo_cache.popitem(last=False)
+
+    def _card_at(self, event):
+        """Returns the index of the card under the pointer, or None."""
+        if not self.columns:
+            return None
+        column, x_offset = divmod(self.canvas.canvasx(event.x) - self.GAP, self.CARD_WIDTH + self.GAP)
+        row, y_offset = divmod(self.canvas.canvasy(event.y) - self.GAP, self.CARD_HEIGHT + self.GAP)
+        if column < 0 or row < 0 or column >= self.columns or x_offset > self.CARD_WIDTH or y_offset > self.CARD_HEIGHT:
+            return None # In a gap or outside the grid
+        index = int(row) * self.columns + int(column)
+        return index if index < len(self.legos) else None
+
+    def _on_click(self, event):
+        if self.selected in self.drawn:
+            self.canvas.itemconfigure(self.drawn[self.selected], width=1)
+        self.selected = self._card_at(event)
+        if self.selected in self.drawn:
+            self.canvas.itemconfigure(self.drawn[self.selected], width=3)
+
+    def _on_double_click(self, event):
+        index = self._card_at(event)
+        if index is None:
+            return
+        articul, name, part_count, all_parts, picture, series, favorite = self.legos[index]
+        # Same shape as a row of the search results, which show_lego_details expects
+        all_parts_text = 'Так' if all_parts == 1 else 'Ні' if all_parts == 0 else 'N/A'
+        self.app.show_lego_details((articul, name, part_count, all_parts_text, picture, series, 'Так' if favorite == 1 else 'Ні'))
+
 class LegoApp:
     def __init__(self, master):
         self.master = master
@@ -213,7 +1553,6 @@ class LegoApp:
         style.map('TButton', background=[('active', ''), ('pressed', '')], foreground=[('active', ''), ('pressed', '')]) # Prevent default highlight color
 
         # Style for favorite items in display mode
-        FAVORITE_BG_COLOR = '#fff5cc' # Light gold/yellow for favorites
         style.configure('Favorite.TLabelframe', background=FAVORITE_BG_COLOR, foreground=TEXT_COLOR)
         style.configure('Favorite.TLabelframe.Label', background=FAVORITE_BG_COLOR, foreground=TEXT_COLOR)
         style.configure('Favorite.TLabel', background=FAVORITE_BG_COLOR, foreground=TEXT_COLOR) # For labels inside a favorite frame
@@ -225,6 +1564,12 @@ class LegoApp:
 
         self.editing_articul = None # To store the articul of the LEGO being edited
 
+        # Pictures are downloaded by worker threads; Tk images are only created on the main thread
+        self.image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS)
+        self.image_results = queue.Queue()
+        self.master.after(50, self._process_image_results)
+        self.dead_picture_urls = get_dead_picture_urls() # Refreshed when a gallery opens or a link check ends
+
         # Add LEGO Section
         add_frame = tk.LabelFrame(master, text="Додати новий LEGO", bg=BG_COLOR, fg=TEXT_COLOR) # Translated title
         add_frame.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
@@ -299,11 +1644,21 @@ class LegoApp:
         self.search_favorite_only_checkbutton = tk.Checkbutton(search_frame, variable=self.search_favorite_only_var, bg=BG_COLOR)
         self.search_favorite_only_checkbutton.grid(row=6, column=1, padx=5, pady=2, sticky=tk.W)
 
+        tk.Label(search_frame, text="Деталі в наявності:", bg=BG_COLOR, fg=TEXT_COLOR).grid(row=7, column=0, sticky=tk.W)
+        self.search_buildable_combobox = ttk.Combobox(search_frame, values=list(BUILDABLE_FILTERS), state="readonly")
+        self.search_buildable_combobox.grid(row=7, column=1, padx=5, pady=2)
+        self.search_buildable_combobox.set('') # Set initial value to empty
+
+        tk.Label(search_frame, text="Стан зображення:", bg=BG_COLOR, fg=TEXT_COLOR).grid(row=8, column=0, sticky=tk.W)
+        self.search_image_health_combobox = ttk.Combobox(search_frame, values=list(IMAGE_HEALTH_FILTERS), state="readonly")
+        self.search_image_health_combobox.grid(row=8, column=1, padx=5, pady=2)
+        self.search_image_health_combobox.set('') # Set initial value to empty
+
         self.search_button = tk.Button(search_frame, text="Пошук", command=self.search_lego, bg=FRAME_COLOR, fg=TEXT_COLOR, font=("TkDefaultFont", 10, "bold")) # Translated button text, bold
-        self.search_button.grid(row=7, column=0, pady=10, padx=5, sticky=tk.E) # Adjusted row
+        self.search_button.grid(row=9, column=0, pady=10, padx=5, sticky=tk.E) # Adjusted row
 
         self.clear_search_button = tk.Button(search_frame, text="Очистити пошук", command=self.clear_search_fields, bg=FRAME_COLOR, fg=TEXT_COLOR)
-        self.clear_search_button.grid(row=7, column=1, pady=10, padx=5, sticky=tk.W) # Adjusted row
+        self.clear_search_button.grid(row=9, column=1, pady=10, padx=5, sticky=tk.W) # Adjusted row
 
         # Search Results Section
         results_frame = tk.LabelFrame(master, text="Результати Пошуку", bg=BG_COLOR, fg=TEXT_COLOR) # Translated title
@@ -348,6 +1703,9 @@ class LegoApp:
         self.toggle_favorite_button = tk.Button(action_button_frame, text="Змінити статус Улюбленого", command=self.toggle_selected_favorite, bg=FRAME_COLOR, fg=TEXT_COLOR)
         self.toggle_favorite_button.pack(side=tk.LEFT, padx=5)
 
+        self.export_button = tk.Button(action_button_frame, text="Експорт результатів", command=self.export_search_results, bg=FRAME_COLOR, fg=TEXT_COLOR)
+        self.export_button.pack(side=tk.LEFT, padx=5)
+
         # Display Mode Button
         self.display_button = tk.Button(master, text="Показати галерею", command=self.show_display_mode, bg=FRAME_COLOR, fg=TEXT_COLOR, font=("TkDefaultFont", 14, "bold")) # Translated button text, bold and bigger
         self.display_button.grid(row=2, column=0, pady=10)
@@ -359,6 +1717,22 @@ class LegoApp:
         self.favorite_display_button = tk.Button(master, text="Показати улюблені", command=self.show_favorite_display_mode, bg=FRAME_COLOR, fg=TEXT_COLOR, font=("TkDefaultFont", 14, "bold"))
         self.favorite_display_button.grid(row=3, column=0, columnspan=2, pady=10)
 
+        # Parts inventory import and maintenance tools
+        tools_frame = tk.Frame(master, bg=BG_COLOR)
+        tools_frame.grid(row=4, column=0, columnspan=2, pady=5)
+
+        self.import_set_parts_button = tk.Button(tools_frame, text="Імпорт деталей наборів (CSV)", command=self.import_set_parts, bg=FRAME_COLOR, fg=TEXT_COLOR)
+        self.import_set_parts_button.pack(side=tk.LEFT, padx=5)
+
+        self.import_owned_parts_button = tk.Button(tools_frame, text="Імпорт наявних деталей (CSV)", command=self.import_owned_parts, bg=FRAME_COLOR, fg=TEXT_COLOR)
+        self.import_owned_parts_button.pack(side=tk.LEFT, padx=5)
+
+        self.warm_cache_button = tk.Button(tools_frame, text="Підготувати кеш зображень", command=self.show_cache_warming, bg=FRAME_COLOR, fg=TEXT_COLOR)
+        self.warm_cache_button.pack(side=tk.LEFT, padx=5)
+
+        self.link_check_button = tk.Button(tools_frame, text="Перевірити зображення", command=self.show_link_check, bg=FRAME_COLOR, fg=TEXT_COLOR)
+        self.link_check_button.pack(side=tk.LEFT, padx=5)
+
     def add_lego(self):
         articul = self.articul_entry.get().strip()
         name = self.name_entry.get().strip()
@@ -426,15 +1800,20 @@ class LegoApp:
         self.search_all_parts_entry.delete(0, tk.END)
         self.search_series_combobox.set('')
         self.search_favorite_only_var.set(0)
+        self.search_buildable_combobox.set('')
+        self.search_image_health_combobox.set('')
 
-    def search_lego(self):
+    def get_search_filters(self):
+        """Reads the search form into search_legos_in_db keyword arguments, or returns None after warning about bad input."""
         articul = self.search_articul_entry.get().strip()
         name = self.search_name_entry.get().strip()
         min_part_count_str = self.search_min_part_count_entry.get().strip()
         max_part_count_str = self.search_max_part_count_entry.get().strip()
         all_parts_str = self.search_all_parts_entry.get().strip()
         series = self.search_series_combobox.get().strip() # Get series from search combobox
-        favorite_only = self.search_favorite_only_var.get()
+        favorite_only = True if self.search_favorite_only_var.get() else None # Unchecked means any, not only non-favorites
+        buildable = BUILDABLE_FILTERS.get(self.search_buildable_combobox.get())
+        image_health = IMAGE_HEALTH_FILTERS.get(self.search_image_health_combobox.get())
 
         min_part_count = None
         max_part_count = None
@@ -447,7 +1826,7 @@ class LegoApp:
                 max_part_count = int(max_part_count_str)
         except ValueError:
             messagebox.showwarning("Невірне введення", "Значення кількості деталей має бути цілим числом.") # Translated message
-            return
+            return None
 
         try:
             if all_parts_str:
@@ -456,15 +1835,23 @@ class LegoApp:
                     raise ValueError("Невірне значення для 'Всі деталі'") # Translated error
         except ValueError:
              messagebox.showwarning("Невірне введення", "'Всі деталі' має бути 0 або 1.") # Translated message
-             return
+             return None
+
+        return dict(articul=articul if articul else None,
+                    name=name if name else None,
+                    min_part_count=min_part_count,
+                    max_part_count=max_part_count,
+                    all_parts=all_parts,
+                    series=series if series else None,
+                    favorite_only=favorite_only,
+                    buildable=buildable,
+                    image_health=image_health)
 
-        results = search_legos_in_db(articul=articul if articul else None,
-                                   name=name if name else None,
-                                   min_part_count=min_part_count,
-                                   max_part_count=max_part_count,
-                                   all_parts=all_parts,
-                                   series=series if series else None,
-                                   favorite_only=favorite_only)
+    def search_lego(self):
+        filters = self.get_search_filters()
+        if filters is None:
+            return
+        results = search_legos_in_db(**filters)
 
         # Clear previous results
         self.clear_search_results()
@@ -573,7 +1960,7 @@ class LegoApp:
 
         details_window = tk.Toplevel(self.master)
         details_window.title(f"Деталі: {name} ({articul})") 
-        details_window.geometry("400x400")
+        details_window.geometry("400x460")
         details_window.configure(bg=BG_COLOR) 
 
         details_frame = ttk.Frame(details_window, padding="10")
@@ -586,18 +1973,215 @@ class LegoApp:
         ttk.Label(details_frame, text=f"Всі деталі: {all_parts_text if all_parts_text else 'N/A'}").pack(anchor=tk.W, pady=2) # Display as is from tree
         ttk.Label(details_frame, text=f"Улюблене: {favorite_text if favorite_text else 'Ні'}").pack(anchor=tk.W, pady=2) # Display favorite status
 
+        inventory = get_inventory_summary(articul)
+        if inventory:
+            total_quantity, missing_quantity = inventory
+            ttk.Label(details_frame, text=f"Деталі в наявності: {total_quantity - missing_quantity} з {total_quantity} (бракує: {missing_quantity})").pack(anchor=tk.W, pady=2)
+            if missing_quantity:
+                tk.Button(details_frame, text="Відсутні деталі", command=lambda: self.show_missing_parts(articul, name), bg=FRAME_COLOR, fg=TEXT_COLOR).pack(anchor=tk.W, pady=2)
+
         if picture:
-            img = get_image_from_url(picture, size=(350, 250))
-            if img:
-                img_label = ttk.Label(details_frame, image=img) # Changed to ttk.Label
-                img_label.image = img # Keep a reference
-                details_window.image_reference = img # Store reference in window
-                img_label.pack(pady=10)
-            else:
-                ttk.Label(details_frame, text="Помилка завантаження зображення", wraplength=350).pack(pady=10) # Translated message
+            img_label = ttk.Label(details_frame, wraplength=350) # Changed to ttk.Label
+            img_label.pack(pady=10)
+            self.request_image(img_label, picture, (350, 250))
         else:
             ttk.Label(details_frame, text="Зображення відсутнє", wraplength=350).pack(pady=10) # Translated message
 
+    def show_missing_parts(self, articul, name):
+        """Lists the parts a set still needs in a new window."""
+        missing_window = tk.Toplevel(self.master)
+        missing_window.title(f"Відсутні деталі: {name} ({articul})")
+        missing_window.geometry("450x400")
+        missing_window.configure(bg=BG_COLOR)
+
+        missing_tree = ttk.Treeview(missing_window, columns=("Деталь", "Колір", "Потрібно", "Є"), show="headings")
+        for column in ("Деталь", "Колір", "Потрібно", "Є"):
+            missing_tree.heading(column, text=column)
+            missing_tree.column(column, width=100)
+
+        scrollbar_y = ttk.Scrollbar(missing_window, orient=tk.VERTICAL, command=missing_tree.yview)
+        missing_tree.configure(yscrollcommand=scrollbar_y.set)
+        scrollbar_y.pack(side=tk.RIGHT, fill=tk.Y)
+        missing_tree.pack(expand=True, fill="both", padx=5, pady=5)
+
+        for row in get_missing_parts(articul):
+            missing_tree.insert("", tk.END, values=row)
+
+    def import_set_parts(self):
+        """Asks for a set inventory CSV and loads it into the parts tables in the background."""
+        path = filedialog.askopenfilename(title="Деталі наборів (CSV)", filetypes=[("CSV", "*.csv *.csv.gz"), ("Всі файли", "*.*")])
+        if not path:
+            return
+        self.run_with_progress("Імпорт деталей наборів", lambda progress, stop_event: import_set_parts_csv(path, progress=progress, stop_event=stop_event),
+                               self._describe_import)
+
+    def import_owned_parts(self):
+        """Asks for a loose-parts CSV and replaces the owned parts with it in the background."""
+        path = filedialog.askopenfilename(title="Наявні деталі (CSV)", filetypes=[("CSV", "*.csv *.csv.gz"), ("Всі файли", "*.*")])
+        if not path:
+            return
+        self.run_with_progress("Імпорт наявних деталей", lambda progress, stop_event: import_owned_parts_csv(path, progress=progress, stop_event=stop_event),
+                               self._describe_import)
+
+    def _describe_import(self, state, finished):
+        if not finished:
+            if state['processed'] >= state['total']: # File read, totals are being refreshed
+                return "Збереження..."
+            return f"Прочитано рядків: {state['rows']}"
+        if state['error']:
+            return f"Помилка: {state['error']}"
+        if state['stopped']:
+            return "Скасовано, дані не змінено"
+        return f"Імпортовано рядків: {state['imported']}"
+
+    def run_with_progress(self, title, job, describe, on_done=None):
+        """Runs job(progress, stop_event) on a background thread in a progress window with a cancel button.
+
+        The job reports dicts with at least 'processed' and 'total' and returns the final one;
+        describe(state, finished) turns a state into the status text. on_done(state), if given, is called
+        on the main thread once the job has returned, even if the window was closed before.
+        """
+        job_window = tk.Toplevel(self.master)
+        job_window.title(title)
+        job_window.geometry("400x150")
+        job_window.configure(bg=BG_COLOR)
+
+        progressbar = ttk.Progressbar(job_window, length=360, mode='determinate')
+        progressbar.pack(pady=15)
+        status_label = tk.Label(job_window, text="Підготовка...", bg=BG_COLOR, fg=TEXT_COLOR)
+        status_label.pack(pady=5)
+
+        stop_event = threading.Event()
+        updates = queue.Queue()
+        cancel_button = tk.Button(job_window, text="Скасувати", command=stop_event.set, bg=FRAME_COLOR, fg=TEXT_COLOR)
+        cancel_button.pack(pady=5)
+
+        def on_close():
+            stop_event.set() # The job stops after its current step
+            job_window.destroy()
+        job_window.protocol("WM_DELETE_WINDOW", on_close)
+
+        def run():
+            updates.put(('done', job(lambda state: updates.put(('progress', state)), stop_event)))
+        threading.Thread(target=run, daemon=True).start()
+
+        def poll():
+            try:
+                while True:
+                    kind, state = updates.get_nowait()
+                    if kind == 'done' and on_done:
+                        on_done(state)
+                    if job_window.winfo_exists():
+                        progressbar['maximum'] = max(1, state['total'])
+                        progressbar['value'] = state['processed']
+                        status_label.config(text=describe(state, kind == 'done'))
+                        if kind == 'done':
+                            cancel_button.config(text="Закрити", command=job_window.destroy)
+                    if kind == 'done':
+                        return
+            except queue.Empty:
+                pass
+            if job_window.winfo_exists() or on_done: # Keep waiting for the job after its window was closed
+                self.master.after(200, poll)
+        poll()
+
+    def export_search_results(self):
+        """Streams everything matching the current search filters to a CSV or JSON Lines file."""
+        filters = self.get_search_filters()
+        if filters is None:
+            return
+        path = filedialog.asksaveasfilename(title="Експорт", defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("CSV (gzip)", "*.csv.gz"),
+                                                       ("JSON Lines", "*.jsonl"), ("JSON Lines (gzip)", "*.jsonl.gz")])
+        if not path:
+            return
+
+        def describe(state, finished):
+            text = f"{state['processed']} з {state['total']}"
+            if not finished:
+                return text
+            if state['error']:
+                return f"Помилка: {state['error']}"
+            return f"{'Скасовано' if state['stopped'] else 'Збережено'}: {text}"
+        self.run_with_progress("Експорт", lambda progress, stop_event: export_legos(path, filters, progress=progress, stop_event=stop_event), describe)
+
+    def show_cache_warming(self):
+        """Runs the thumbnail cache warming job in the background with a progress window."""
+        def describe(state, finished):
+            text = f"{state['processed']} з {state['total']}, помилок: {state['failed']}"
+            if finished:
+                return f"{'Зупинено' if state['stopped'] else 'Готово'}: {text}"
+            return f"{text}, залишилось: {_format_eta(state['eta'])}"
+        # One job at a time: every run reads and writes the same checkpoint row
+        self.warm_cache_button.config(state=tk.DISABLED)
+        self.run_with_progress("Кеш зображень", lambda progress, stop_event: warm_image_cache(progress=progress, stop_event=stop_event), describe,
+                               on_done=lambda state: self.warm_cache_button.config(state=tk.NORMAL))
+
+    def show_link_check(self):
+        """Checks every picture URL in the background and refreshes the list of dead ones when done."""
+        def job(progress, stop_event):
+            state = check_picture_urls(progress=progress, stop_event=stop_event)
+            self.dead_picture_urls = get_dead_picture_urls() # A set swap, safe to do from this thread
+            return state
+
+        def describe(state, finished):
+            text = f"{state['processed']} з {state['total']}, недоступних: {state['dead']}, не відповідають: {state['failed']}"
+            if finished:
+                return f"{'Зупинено' if state['stopped'] else 'Готово'}: {text}"
+            return text
+        self.run_with_progress("Перевірка зображень", job, describe)
+
+    def request_image(self, label, picture, size):
+        """Loads a picture in the background and shows it in the label once it is ready."""
+        label.configure(text="Завантаження зображення...")
+        alive = threading.Event() # Tk may only be asked on the main thread, so track the label's lifetime here
+        alive.set()
+        label.bind("<Destroy>", lambda e: alive.clear(), add='+')
+        self.request_photo(picture, size, lambda photo: self._show_label_image(label, photo), alive.is_set)
+
+    def _show_label_image(self, label, photo):
+        if photo:
+            label.configure(image=photo, text='')
+            label.image = photo # Keep a reference
+        else:
+            label.configure(text="Помилка завантаження зображення")
+
+    def request_photo(self, picture, size, on_ready, is_alive):
+        """Loads a picture on a worker thread and calls on_ready(photo or None) on the main thread.
+
+        on_ready is skipped if is_alive() is false by then, e.g. because its window was closed. is_alive is
+        also checked on the worker thread before loading, so it must not call into Tk.
+        """
+        self.image_executor.submit(self._load_image_job, picture, size, on_ready, is_alive)
+
+    def _load_image_job(self, picture, size, on_ready, is_alive):
+        if not is_alive(): # Its card or window went away while the job was queued
+            return
+        # Runs on a worker thread: identical URLs requested at once share one download.
+        # A cached thumbnail is shown even if the link checker found its URL gone since; otherwise known
+        # dead URLs are not downloaded, so the card doesn't wait for a timeout
+        data = load_thumbnail_data(picture, size, download=picture not in self.dead_picture_urls)
+        self.image_results.put((picture, size, on_ready, is_alive, data))
+
+    def _process_image_results(self):
+        """Hands downloaded images to their callbacks on the main thread."""
+        try:
+            while True:
+                picture, size, on_ready, is_alive, data = self.image_results.get_nowait()
+                if not is_alive(): # The window was closed while downloading
+                    continue
+                photo = None
+                if data:
+                    try:
+                        photo = tk.PhotoImage(data=data) # Tk decodes the PNG itself, no Pillow conversion
+                    except tk.TclError as e:
+                        print(f"Error displaying image from {picture}: {e}")
+                        discard_thumbnail(picture, size)
+                on_ready(photo)
+        except queue.Empty:
+            pass
+        self.master.after(50, self._process_image_results)
+
     def edit_selected_lego(self):
         selected_items = self.results_tree.selection()
         if len(selected_items) != 1:
@@ -634,7 +2218,20 @@ class LegoApp:
         self.series_combobox['values'] = all_series
         self.search_series_combobox['values'] = all_series
 
+    def show_canvas_gallery(self, title, legos, highlight_favorites=True):
+        """Opens a gallery window drawn by GalleryCanvas."""
+        display_window = tk.Toplevel(self.master)
+        display_window.title(title)
+        display_window.geometry("900x800") # Set a larger default size
+        display_window.configure(bg=BG_COLOR) # Set background for display window
+        self.dead_picture_urls = get_dead_picture_urls()
+        display_window.gallery = GalleryCanvas(self, display_window, legos, highlight_favorites)
+
     def show_display_mode(self):
+        if GALLERY_RENDERER == 'canvas':
+            self.show_canvas_gallery("Галерея LEGO", search_legos_in_db()) # Get all legos by searching with no filters
+            return
+
         # Create a new top-level window for the display mode
         display_window = tk.Toplevel(self.master)
         display_window.title("Галерея LEGO") # Translated title
@@ -669,6 +2266,7 @@ class LegoApp:
 
         # Fetch all LEGOs
         all_legos = search_legos_in_db() # Get all legos by searching with no filters
+        self.dead_picture_urls = get_dead_picture_urls()
 
         # Configure grid columns to expand within the display_frame
         max_cols = 4 # Number of columns in the grid
@@ -678,9 +2276,6 @@ class LegoApp:
         row_num = 0
         col_num = 0
 
-        # Store image references to prevent garbage collection
-        display_window.image_references = []
-
         for lego in all_legos:
             articul, name, part_count, all_parts, picture, series, favorite = lego # Unpack favorite status
 
@@ -691,14 +2286,9 @@ class LegoApp:
             item_frame.grid(row=row_num, column=col_num, padx=5, pady=5, sticky="nsew")
 
             if picture:
-                img = get_image_from_url(picture, size=(200, 150)) 
-                if img:
-                    img_label = ttk.Label(item_frame, image=img, style=label_style_to_use) 
-                    img_label.image = img 
-                    display_window.image_references.append(img) 
-                    img_label.pack(pady=2)
-                else:
-                    ttk.Label(item_frame, text="Помилка завантаження зображення", wraplength=180, style=label_style_to_use).pack(pady=2) 
+                img_label = ttk.Label(item_frame, wraplength=180, style=label_style_to_use) 
+                img_label.pack(pady=2)
+                self.request_image(img_label, picture, (200, 150))
             else:
                 ttk.Label(item_frame, text="Зображення відсутнє", wraplength=180, style=label_style_to_use).pack(pady=2) 
 
@@ -732,6 +2322,11 @@ class LegoApp:
 
     def show_favorite_display_mode(self):
         """Displays favorite LEGOs in a gallery view."""
+        if GALLERY_RENDERER == 'canvas':
+            # Every card here is a favorite, so the favorite highlight would carry no information
+            self.show_canvas_gallery("Галерея Улюблених LEGO", search_legos_in_db(favorite_only=True), highlight_favorites=False)
+            return
+
         display_window = tk.Toplevel(self.master)
         display_window.title("Галерея Улюблених LEGO") 
         display_window.geometry("900x800") 
@@ -756,6 +2351,7 @@ class LegoApp:
         display_window.grid_rowconfigure(0, weight=1)
 
         favorite_legos = search_legos_in_db(favorite_only=True) 
+        self.dead_picture_urls = get_dead_picture_urls()
 
         max_cols = 4 
         for i in range(max_cols):
@@ -763,7 +2359,6 @@ class LegoApp:
 
         row_num = 0
         col_num = 0
-        display_window.image_references = []
 
         for lego_data in favorite_legos:
             articul, name, part_count, all_parts, picture, series, _ = lego_data # Favorite status not directly needed for display item content here
@@ -772,14 +2367,9 @@ class LegoApp:
             item_frame.grid(row=row_num, column=col_num, padx=5, pady=5, sticky="nsew")
 
             if picture:
-                img = get_image_from_url(picture, size=(200, 150)) 
-                if img:
-                    img_label = ttk.Label(item_frame, image=img) 
-                    img_label.image = img 
-                    display_window.image_references.append(img) 
-                    img_label.pack(pady=2)
-                else:
-                    ttk.Label(item_frame, text="Помилка завантаження зображення", wraplength=180).pack(pady=2) 
+                img_label = ttk.Label(item_frame, wraplength=180) 
+                img_label.pack(pady=2)
+                self.request_image(img_label, picture, (200, 150))
             else:
                 ttk.Label(item_frame, text="Зображення відсутнє", wraplength=180).pack(pady=2) 
 
@@ -837,6 +2427,8 @@ class LegoApp:
             ttk.Label(stats_frame, text="Статистика Бази Даних", font=('TkDefaultFont', 14, 'bold')).pack(pady=5) # Translated title
             ttk.Label(stats_frame, text=f"Загальна кількість наборів LEGO: {total_count}").pack(anchor=tk.W, pady=2) # Translated label
             ttk.Label(stats_frame, text=f"Загальна кількість деталей (орієнтовно): {total_parts}").pack(anchor=tk.W, pady=2) # Translated label
+            image_stats = get_image_fetch_stats()
+            ttk.Label(stats_frame, text=f"Завантажень зображень: {image_stats['network_fetches']} (заощаджено: {image_stats['saved_fetches']})").pack(anchor=tk.W, pady=2)
 
             if series_counts:
                 ttk.Label(stats_frame, text="\nНабори за серіями:", font=('TkDefaultFont', 10, 'bold')).pack(anchor=tk.W, pady=5) # Translated label
@@ -849,9 +2441,57 @@ class LegoApp:
             if conn:
                 conn.close()
 
+def _print_warm_progress(state):
+    print(f"{state['processed']}/{state['total']} processed, {state['failed']} failed, ETA {_format_eta(state['eta'])}")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="База Даних LEGO")
+    parser.add_argument('--warm-cache', action='store_true', help="download and thumbnail all pictures without opening the GUI")
+    parser.add_argument('--check-images', action='store_true', help="check all picture URLs without opening the GUI")
+    parser.add_argument('--serve', action='store_true', help="serve the collection as a local HTTP JSON API instead of opening the GUI")
+    parser.add_argument('--host', default=API_HOST, help="address for --serve")
+    parser.add_argument('--port', type=int, default=API_PORT, help="port for --serve")
+    parser.add_argument('--export', metavar='PATH', help="export to a .csv or .jsonl file (add .gz to compress) instead of opening the GUI")
+    parser.add_argument('--articul', help="export only articuls containing this text")
+    parser.add_argument('--name', help="export only names containing this text")
+    parser.add_argument('--series', help="export only series containing this text")
+    parser.add_argument('--min-part-count', type=int, help="export only sets with at least this many parts")
+    parser.add_argument('--max-part-count', type=int, help="export only sets with at most this many parts")
+    parser.add_argument('--all-parts', type=int, choices=[0, 1], help="export only sets with (1) or without (0) all parts")
+    parser.add_argument('--favorite-only', action='store_true', help="export only favorites")
+    parser.add_argument('--buildable', choices=['yes', 'no'], help="export only sets buildable from owned parts (yes) or missing parts (no)")
+    parser.add_argument('--image-health', choices=['ok', 'dead', 'failed', 'unchecked'], help="export only sets whose picture is in this link check state")
+    parser.add_argument('--benchmark-display', action='store_true', help="time the main-thread cost of showing one gallery card")
+    args = parser.parse_args()
+
     initialize_database()
 
-    root = tk.Tk()
-    app = LegoApp(root)
-    root.mainloop() 
+    if args.warm_cache:
+        try:
+            state = warm_image_cache(progress=_print_warm_progress)
+        except KeyboardInterrupt: # Batches already finished are checkpointed
+            print("Interrupted, the next run will resume.")
+        else:
+            print(f"Done: {state['processed']} processed, {state['failed']} failed.")
+    elif args.check_images:
+        state = check_picture_urls(progress=lambda state: print(f"{state['processed']}/{state['total']} checked, {state['dead']} dead, {state['failed']} failed"))
+        print(f"Done: {state['processed']} checked, {state['dead']} dead, {state['failed']} failed.")
+    elif args.serve:
+        serve_api(args.host, args.port)
+    elif args.export:
+        filters = dict(articul=args.articul, name=args.name, series=args.series, min_part_count=args.min_part_count,
+                       max_part_count=args.max_part_count, all_parts=args.all_parts, favorite_only=True if args.favorite_only else None,
+                       buildable={'yes': True, 'no': False}.get(args.buildable), image_health=args.image_health)
+        try:
+            state = export_legos(args.export, filters, progress=lambda state: print(f"{state['processed']}/{state['total']} exported"))
+        except KeyboardInterrupt:
+            print("Export cancelled.")
+        else:
+            print(f"Error: {state['error']}" if state['error'] else f"Exported {state['processed']} LEGO sets to {args.export}.")
+    elif args.benchmark_display:
+        for path, milliseconds in benchmark_display_path().items():
+            print(f"{path}: {milliseconds:.2f} ms per card (median)")
+    else:
+        root = tk.Tk()
+        app = LegoApp(root)
+        root.mainloop() 